@@ -0,0 +1,121 @@
+"""
+Local Bitcoin address validation (Base58Check and Bech32/Bech32m)
+"""
+import hashlib
+from typing import List, Optional
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+BECH32_CHARSET = 'qpzry9x8gf2tvdw0s3jn54khce6mua7l'
+BECH32_CONST = 1
+BECH32M_CONST = 0x2bc830a3
+
+# Length bounds checked before any decoding; Base58 decoding is quadratic in
+# the input length, so oversized user input must never reach it
+MAX_ADDRESS_LENGTH = 90
+BASE58_ADDRESS_LENGTHS = range(25, 36)
+
+# Base58 version bytes (P2PKH, P2SH) and Bech32 human-readable part per network
+NETWORKS = {
+    'mainnet': {'versions': (0x00, 0x05), 'hrp': 'bc'},
+    'testnet': {'versions': (0x6f, 0xc4), 'hrp': 'tb'},
+    'regtest': {'versions': (0x6f, 0xc4), 'hrp': 'bcrt'},
+}
+
+
+def _b58decode_check(address: str) -> Optional[bytes]:
+    """Decode a Base58Check string and return its payload if the checksum matches"""
+    num = 0
+    for char in address:
+        index = BASE58_ALPHABET.find(char)
+        if index < 0:
+            return None
+        num = num * 58 + index
+
+    leading_zeros = len(address) - len(address.lstrip('1'))
+    raw = b'\x00' * leading_zeros + num.to_bytes((num.bit_length() + 7) // 8, 'big')
+    if len(raw) < 5:
+        return None
+
+    payload, checksum = raw[:-4], raw[-4:]
+    if hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] != checksum:
+        return None
+    return payload
+
+
+def _bech32_polymod(values: List[int]) -> int:
+    generator = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ value
+        for i in range(5):
+            if (top >> i) & 1:
+                chk ^= generator[i]
+    return chk
+
+
+def _bech32_hrp_expand(hrp: str) -> List[int]:
+    return [ord(x) >> 5 for x in hrp] + [0] + [ord(x) & 31 for x in hrp]
+
+
+def _convertbits(data: List[int], frombits: int, tobits: int) -> Optional[List[int]]:
+    """Regroup bits without padding, as required when decoding a witness program"""
+    acc = 0
+    bits = 0
+    result = []
+    maxv = (1 << tobits) - 1
+    for value in data:
+        acc = (acc << frombits) | value
+        bits += frombits
+        while bits >= tobits:
+            bits -= tobits
+            result.append((acc >> bits) & maxv)
+    if bits >= frombits or ((acc << (tobits - bits)) & maxv):
+        return None
+    return result
+
+
+def _is_valid_segwit(hrp: str, address: str) -> bool:
+    """Validate a BIP173 (Bech32) or BIP350 (Bech32m) segwit address"""
+    if address.lower() != address and address.upper() != address:
+        return False
+    address = address.lower()
+
+    pos = address.rfind('1')
+    if pos < 1 or pos + 7 > len(address) or len(address) > 90 or address[:pos] != hrp:
+        return False
+
+    data = [BECH32_CHARSET.find(x) for x in address[pos + 1:]]
+    if -1 in data:
+        return False
+
+    const = _bech32_polymod(_bech32_hrp_expand(hrp) + data)
+    data = data[:-6]
+    if not data or data[0] > 16:
+        return False
+
+    witness_version = data[0]
+    if const != (BECH32_CONST if witness_version == 0 else BECH32M_CONST):
+        return False
+
+    program = _convertbits(data[1:], 5, 8)
+    if program is None or not 2 <= len(program) <= 40:
+        return False
+    if witness_version == 0 and len(program) not in (20, 32):
+        return False
+    return True
+
+
+def validate_address(address: str, network: str = 'mainnet') -> bool:
+    """Check address format, checksum and network without contacting a node"""
+    params = NETWORKS.get(network)
+    if not params or not address or len(address) > MAX_ADDRESS_LENGTH:
+        return False
+
+    if address.lower().startswith(params['hrp'] + '1'):
+        return _is_valid_segwit(params['hrp'], address)
+
+    if len(address) not in BASE58_ADDRESS_LENGTHS:
+        return False
+    payload = _b58decode_check(address)
+    return payload is not None and len(payload) == 21 and payload[0] in params['versions']
@@ -13,6 +13,7 @@ import shutil
 import time
 import getpass
 from datetime import datetime
+from functools import lru_cache
 
 BANNER = """
 === Bitcoin Mixer - Otomatik Kurulum (Linux) ===
@@ -20,13 +21,28 @@ Bu betik: Docker/Docker Compose kurar, .env dosyası oluşturur, servisleri baş
 """
 
 
-def run(cmd, sudo=False, check=True):
+def _prepare(cmd, sudo=False):
     if sudo and os.geteuid() != 0:
         cmd = ["sudo"] + (cmd if isinstance(cmd, list) else ["bash", "-lc", cmd])
     elif isinstance(cmd, str):
         cmd = ["bash", "-lc", cmd]
     print(">>", " ".join(cmd))
-    return subprocess.run(cmd, check=check)
+    return cmd
+
+
+def run(cmd, sudo=False, check=True):
+    return subprocess.run(_prepare(cmd, sudo), check=check)
+
+
+def spawn(cmd, sudo=False):
+    # Komutu arka planda başlat; bitişini wait_all ile bekle
+    return subprocess.Popen(_prepare(cmd, sudo))
+
+
+def wait_all(procs):
+    for p in procs:
+        if p.wait() != 0:
+            raise subprocess.CalledProcessError(p.returncode, p.args)
 
 
 def which(bin_name):
@@ -45,6 +61,7 @@ def prompt(question, default=None, secret=False):
     return (default if (val == "" and default is not None) else val)
 
 
+@lru_cache(maxsize=1)
 def _has_compose_plugin():
     try:
         out = subprocess.check_output(["docker", "compose", "version"], stderr=subprocess.STDOUT)
@@ -90,9 +107,13 @@ def ensure_docker():
         print("https://docs.docker.com/engine/install/")
         sys.exit(1)
 
+    # Kurulumdan önceki tespit sonuçları artık geçersiz
+    _has_compose_plugin.cache_clear()
+    compose_cmd.cache_clear()
     print("Docker kuruldu. Compose eklentisi:", "var" if _has_compose_plugin() else "yok")
 
 
+@lru_cache(maxsize=1)
 def compose_cmd():
     return ["docker", "compose"] if _has_compose_plugin() else (["docker-compose"] if which("docker-compose") else None)
 
@@ -102,33 +123,41 @@ def write_env(env_path, data: dict):
         ts = datetime.now().strftime("%Y%m%d-%H%M%S")
         shutil.copy(env_path, env_path + f".bak-{ts}")
         print(f"Var olan .env yedeklendi: {env_path}.bak-{ts}")
-    lines = []
-    for k, v in data.items():
-        lines.append(f"{k}={v}")
     with open(env_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines) + "\n")
+        f.writelines(f"{k}={v}\n" for k, v in data.items())
     print(f".env yazıldı: {env_path}")
 
 
+def write_env_module(module_path, env_path, data: dict):
+    # config.py her açılışta .env ayrıştırmasın diye içeriği Python modülü olarak yaz
+    with open(module_path, "w", encoding="utf-8") as f:
+        f.write("# Otomatik oluşturuldu - elle düzenlemeyin, .env dosyasını düzenleyin\n")
+        f.write(f"SOURCE_MTIME = {os.path.getmtime(env_path)!r}\n")
+        f.write(f"ENV = {dict(data)!r}\n")
+    print(f"Derlenmiş ortam modülü yazıldı: {module_path}")
+
+
 def ensure_ssl():
     os.makedirs("ssl", exist_ok=True)
     cert = "ssl/cert.pem"
     key = "ssl/key.pem"
     if os.path.exists(cert) and os.path.exists(key):
         print("SSL sertifikaları mevcut, atlanıyor.")
-        return
-    print("Self-signed SSL sertifikası oluşturuluyor...")
-    run('openssl req -x509 -newkey rsa:4096 -nodes -out ssl/cert.pem -keyout ssl/key.pem -days 365 '
-        '-subj "/C=TR/ST=State/L=City/O=Org/CN=localhost"', sudo=False, check=True)
-    print("SSL sertifikaları oluşturuldu: ssl/cert.pem, ssl/key.pem")
+        return None
+    print("Self-signed SSL sertifikası arka planda oluşturuluyor...")
+    return spawn('openssl req -x509 -newkey rsa:4096 -nodes -out ssl/cert.pem -keyout ssl/key.pem -days 365 '
+                 '-subj "/C=TR/ST=State/L=City/O=Org/CN=localhost"', sudo=False)
 
 
-def bring_up(services):
+def bring_up(services, pending=()):
     cmd = compose_cmd()
     if not cmd:
         print("Docker Compose bulunamadı. Lütfen docker-compose kurun.")
         sys.exit(1)
-    run(cmd + ["up", "-d", "--build"] + services, check=True)
+    # İmajlar derlenirken arka plan işleri (ör. SSL) sürebilir; başlatmadan önce bekle
+    run(cmd + ["build"] + services, check=True)
+    wait_all(pending)
+    run(cmd + ["up", "-d"] + services, check=True)
 
 
 def main():
@@ -150,6 +179,7 @@ def main():
     rpc_pass = prompt("Bitcoin RPC parolası (rpcpassword)", default="", secret=True)
     rpc_host = prompt("Bitcoin RPC host", default="host.docker.internal")
     rpc_port = prompt("Bitcoin RPC port", default="8332")
+    btc_network = prompt("Bitcoin ağı (mainnet/testnet/regtest, düğümle aynı olmalı)", default="mainnet")
 
     # Nginx/SSL seçimi
     use_nginx = prompt("Nginx + SSL (HTTPS) ile çalıştırılsın mı? (y/N)", default="N").lower().startswith("y")
@@ -169,6 +199,7 @@ def main():
         "RPC_PASS": rpc_pass,
         "RPC_HOST": rpc_host,
         "RPC_PORT": rpc_port,
+        "BTC_NETWORK": btc_network,
         "MIN_AMOUNT": "0.001",
         "MAX_AMOUNT": "100",
         "FEE_PERCENT": "0.03",
@@ -180,10 +211,14 @@ def main():
         "CORS_ORIGINS": "https://yourdomain.com",
     }
     write_env(".env", env)
+    write_env_module("env_compiled.py", ".env", env)
 
-    # SSL istenirse üret
+    # SSL istenirse üret (docker compose build ile paralel çalışır)
+    pending = []
     if use_nginx:
-        ensure_ssl()
+        ssl_job = ensure_ssl()
+        if ssl_job:
+            pending.append(ssl_job)
 
     # Servisleri ayağa kaldır
     core_services = ["postgres", "redis", "web", "celery_worker", "celery_beat"]
@@ -191,7 +226,9 @@ def main():
         core_services.append("nginx")
 
     print("Servisler başlatılıyor...")
-    bring_up(core_services)
+    bring_up(core_services, pending)
+    if pending:
+        print("SSL sertifikaları oluşturuldu: ssl/cert.pem, ssl/key.pem")
 
     # Sağlık kontrolü ve çıktı
     time.sleep(5)
@@ -18,6 +18,7 @@ import time
 import secrets
 import getpass
 from datetime import datetime
+from functools import lru_cache
 
 
 def is_windows() -> bool:
@@ -46,6 +47,7 @@ def prompt(question: str, default: str | None = None, secret: bool = False) -> s
     return default if (val == "" and default is not None) else val
 
 
+@lru_cache(maxsize=1)
 def compose_cmd() -> list[str] | None:
     # Prefer 'docker compose' plugin, fallback to 'docker-compose'
     try:
@@ -79,11 +81,19 @@ def write_env(env_path: str, data: dict):
         shutil.copy(env_path, backup)
         print(f"Var olan .env yedeklendi: {backup}")
     with open(env_path, "w", encoding="utf-8") as f:
-        for k, v in data.items():
-            f.write(f"{k}={v}\n")
+        f.writelines(f"{k}={v}\n" for k, v in data.items())
     print(f".env yazıldı: {env_path}")
 
 
+def write_env_module(module_path: str, env_path: str, data: dict):
+    # config.py her açılışta .env ayrıştırmasın diye içeriği Python modülü olarak yaz
+    with open(module_path, "w", encoding="utf-8") as f:
+        f.write("# Otomatik oluşturuldu - elle düzenlemeyin, .env dosyasını düzenleyin\n")
+        f.write(f"SOURCE_MTIME = {os.path.getmtime(env_path)!r}\n")
+        f.write(f"ENV = {dict(data)!r}\n")
+    print(f"Derlenmiş ortam modülü yazıldı: {module_path}")
+
+
 def ensure_ssl_windows():
     # Opsiyonel: OpenSSL varsa self-signed üretelim; yoksa atlansın
     os.makedirs("ssl", exist_ok=True)
@@ -129,6 +139,7 @@ def main():
     rpc_pass = prompt("Bitcoin RPC parolası (rpcpassword)", default="", secret=True)
     rpc_host = prompt("Bitcoin RPC host", default="host.docker.internal")
     rpc_port = prompt("Bitcoin RPC port", default="8332")
+    btc_network = prompt("Bitcoin ağı (mainnet/testnet/regtest, düğümle aynı olmalı)", default="mainnet")
     use_nginx = prompt("Nginx + SSL (HTTPS) ile çalıştırılsın mı? (y/N)", default="N").lower().startswith("y")
 
     # Docker kontrolü
@@ -146,6 +157,7 @@ def main():
         "RPC_PASS": rpc_pass,
         "RPC_HOST": rpc_host,
         "RPC_PORT": rpc_port,
+        "BTC_NETWORK": btc_network,
         "MIN_AMOUNT": "0.001",
         "MAX_AMOUNT": "100",
         "FEE_PERCENT": "0.03",
@@ -157,6 +169,7 @@ def main():
         "CORS_ORIGINS": "https://yourdomain.com",
     }
     write_env(".env", env)
+    write_env_module("env_compiled.py", ".env", env)
 
     # SSL istenirse dene
     if use_nginx:
@@ -6,9 +6,11 @@ import os
 import hashlib
 import secrets
 import logging
-from datetime import datetime
 from decimal import Decimal
-from flask import Flask, request, render_template, abort, jsonify, session, redirect, url_for
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Optional
+from flask import Flask, Response, g, request, render_template, abort, session, redirect, url_for
 from flask_wtf import FlaskForm, CSRFProtect
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -16,13 +18,16 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
 from flask_cors import CORS
+from sqlalchemy.orm import load_only
 from wtforms import StringField, DecimalField, HiddenField
 from wtforms.validators import DataRequired, ValidationError
-import qrcode
+import segno
 import io
 import base64
+import orjson
+import redis
 from config import config
-from models import db, MixingTransaction, SecurityAlert
+from models import db, MixingTransaction, TransactionStatus
 from mixing_service import MixingService
 from tasks import celery, send_security_alert
 
@@ -37,25 +42,49 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.config.from_object(config[os.getenv('FLASK_ENV', 'development')])
 
+# Snapshot of the loaded configuration with plain attribute access; values
+# used on request paths are derived from it once below
+settings = SimpleNamespace(**app.config)
+
+# Amount limits are parsed once here rather than on every form submission
+MIN_AMOUNT = Decimal(str(settings.MIN_AMOUNT))
+MAX_AMOUNT = Decimal(str(settings.MAX_AMOUNT))
+_MIN_AMOUNT_MESSAGE = f"Minimum amount is {settings.MIN_AMOUNT} BTC"
+_MAX_AMOUNT_MESSAGE = f"Maximum amount is {settings.MAX_AMOUNT} BTC"
+
+# BLAKE2b accepts keys of at most 64 bytes
+_ANONYMIZE_KEY = settings.SECRET_KEY.encode()[:64]
+_blake2b = hashlib.blake2b
+
 # Initialize extensions
 db.init_app(app)
 migrate = Migrate(app, db)
 csrf = CSRFProtect(app)
-cors = CORS(app, origins=app.config.get('CORS_ORIGINS', []))
+cors = CORS(app, origins=tuple(getattr(settings, 'CORS_ORIGINS', ())))
+
+# Redis connection pool shared by the rate limiter and application caches
+redis_pool = redis.ConnectionPool.from_url(settings.REDIS_URL, max_connections=64)
+redis_client = redis.Redis(connection_pool=redis_pool)
 
 # Initialize rate limiter
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
-    storage_uri=app.config['REDIS_URL']
+    storage_uri=settings.REDIS_URL,
+    storage_options={'connection_pool': redis_pool},
+    strategy='fixed-window'
 )
+SUSPICIOUS_ACTIVITY_WINDOW = 3600  # seconds
+SUSPICIOUS_ACTIVITY_THRESHOLD = 5  # security alerts per IP within the window
+TRANSACTION_OWNER_TTL = 3600  # seconds
+PAYMENT_CHECK_TTL = 5  # seconds
 
 # Initialize security headers (only in production)
 if app.config['ENV'] == 'production':
     Talisman(app, force_https=True)
 
 # Initialize mixing service
-mixing_service = MixingService(app.config)
+mixing_service = MixingService(settings)
 
 # Form definitions
 class MixerForm(FlaskForm):
@@ -64,10 +93,14 @@ class MixerForm(FlaskForm):
     output_address = StringField('Output Address', validators=[DataRequired()])
     
     def validate_amount(self, field):
-        if field.data < Decimal(str(app.config['MIN_AMOUNT'])):
-            raise ValidationError(f"Minimum amount is {app.config['MIN_AMOUNT']} BTC")
-        if field.data > Decimal(str(app.config['MAX_AMOUNT'])):
-            raise ValidationError(f"Maximum amount is {app.config['MAX_AMOUNT']} BTC")
+        if not field.data.is_finite():
+            raise ValidationError("Invalid amount")
+        if field.data.as_tuple().exponent < -8:
+            raise ValidationError("Amount cannot have more than 8 decimal places")
+        if field.data < MIN_AMOUNT:
+            raise ValidationError(_MIN_AMOUNT_MESSAGE)
+        if field.data > MAX_AMOUNT:
+            raise ValidationError(_MAX_AMOUNT_MESSAGE)
     
     def validate_output_address(self, field):
         if not mixing_service.validate_bitcoin_address(field.data):
@@ -75,49 +108,76 @@ class MixerForm(FlaskForm):
 
 
 # Utility functions
+@lru_cache(maxsize=1024)
 def generate_qr_code(address: str) -> str:
     """Generate QR code for Bitcoin address"""
-    qr = qrcode.QRCode(version=1, box_size=10, border=4)
-    qr.add_data(f"bitcoin:{address}")
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
+    qr = segno.make_qr(f"bitcoin:{address}", error='m')
     buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
+    qr.save(buffer, kind='png', scale=10, border=4)
     
     return base64.b64encode(buffer.getvalue()).decode()
 
 
+# Rendered bytes of templates that take no per-request context
+_static_pages = {}
+
+
+def render_static_page(template: str) -> Response:
+    """Render a context-free template once and serve the cached bytes"""
+    body = _static_pages.get(template)
+    if body is None:
+        body = render_template(template).encode('utf-8')
+        # Pages that embed a per-session CSRF token must not be shared
+        if not app.debug and app.config['WTF_CSRF_FIELD_NAME'] not in g:
+            _static_pages[template] = body
+    return Response(body, mimetype='text/html')
+
+
+def json_response(data: dict, status: int = 200) -> Response:
+    """Serialize a JSON response with orjson"""
+    return Response(orjson.dumps(data, default=str), status=status, mimetype='application/json')
+
+
+@lru_cache(maxsize=4096)
 def anonymize_ip(ip: str) -> str:
     """Anonymize IP address"""
-    return hashlib.sha256(f"{ip}{app.config['SECRET_KEY']}".encode()).hexdigest()[:16]
+    return _blake2b(ip.encode('ascii', 'ignore'), digest_size=8, key=_ANONYMIZE_KEY).hexdigest()
 
 
+@lru_cache(maxsize=4096)
 def anonymize_user_agent(user_agent: str) -> str:
     """Anonymize user agent"""
-    return hashlib.sha256(f"{user_agent}{app.config['SECRET_KEY']}".encode()).hexdigest()[:16]
+    return _blake2b(user_agent.encode(), digest_size=8, key=_ANONYMIZE_KEY).hexdigest()
 
 
 def get_client_ip() -> str:
     """Get client IP address"""
-    if "X-Forwarded-For" in request.headers:
-        ip = request.headers.get("X-Forwarded-For").split(",")[0].strip()
-    elif "X-Real-IP" in request.headers:
-        ip = request.headers.get("X-Real-IP")
-    else:
-        ip = request.remote_addr
-    return ip
+    headers = request.headers
+    forwarded_for = headers.get("X-Forwarded-For")
+    if forwarded_for:
+        # Only the first hop matters; avoid splitting the whole chain
+        comma = forwarded_for.find(",")
+        return (forwarded_for[:comma] if comma >= 0 else forwarded_for).strip()
+    return headers.get("X-Real-IP") or request.remote_addr
+
+
+def record_security_alert(ip_hash: str) -> int:
+    """Count a security alert raised for this IP in a fixed one-hour Redis window"""
+    key = f"secalert:{ip_hash}"
+    pipe = redis_client.pipeline()
+    pipe.incr(key)
+    pipe.expire(key, SUSPICIOUS_ACTIVITY_WINDOW, nx=True)
+    recent_alerts, _ = pipe.execute()
+    return recent_alerts
 
 
 def check_suspicious_activity(ip_hash: str, user_agent_hash: str) -> bool:
     """Check for suspicious activity patterns"""
-    # Check recent alerts from this IP
-    recent_alerts = SecurityAlert.query.filter_by(ip_hash=ip_hash).filter(
-        SecurityAlert.created_at >= datetime.utcnow() - timedelta(hours=1)
-    ).count()
+    # Check recent alerts from this IP; only alert sites increment the counter
+    recent_alerts = int(redis_client.get(f"secalert:{ip_hash}") or 0)
     
-    if recent_alerts > 5:
+    if recent_alerts > SUSPICIOUS_ACTIVITY_THRESHOLD:
+        record_security_alert(ip_hash)
         send_security_alert.delay(
             "SUSPICIOUS_ACTIVITY",
             "high",
@@ -128,6 +188,36 @@ def check_suspicious_activity(ip_hash: str, user_agent_hash: str) -> bool:
     return True
 
 
+def get_transaction_owner(transaction_id: str) -> Optional[str]:
+    """Return the session_id that owns a transaction, cached in Redis"""
+    key = f"txsession:{transaction_id}"
+    owner = redis_client.get(key)
+    if owner is not None:
+        return owner.decode()
+    
+    transaction = db.session.get(
+        MixingTransaction,
+        transaction_id,
+        options=[load_only(MixingTransaction.session_id)]
+    )
+    if not transaction:
+        return None
+    
+    redis_client.setex(key, TRANSACTION_OWNER_TTL, transaction.session_id)
+    return transaction.session_id
+
+
+def forget_transaction_owner(transaction_id: str):
+    """Drop a cached owner whose transaction no longer exists (e.g. cleaned up)"""
+    redis_client.delete(f"txsession:{transaction_id}")
+
+
+@app.teardown_request
+def discard_pending_logs(exc):
+    """Never carry buffered mixing logs over to the next request on this thread"""
+    mixing_service.discard_logs()
+
+
 # Session management
 @app.before_request
 def create_session():
@@ -141,7 +231,7 @@ def create_session():
 @app.route("/")
 def index():
     """Home page"""
-    return render_template("index.html")
+    return render_static_page("index.html")
 
 
 @app.route("/mixer", methods=["GET", "POST"])
@@ -172,6 +262,7 @@ def mixer():
             
             # Generate QR code for input address
             qr_code = generate_qr_code(transaction.input_address)
+            logger.debug(f"QR code cache: {generate_qr_code.cache_info()}")
             
             logger.info(f"New mixing transaction created: {transaction.id}")
             
@@ -189,23 +280,27 @@ def mixer():
 @app.route("/about")
 def about():
     """About page"""
-    return render_template("about.html")
+    return render_static_page("about.html")
 
 
 @app.route("/status/<transaction_id>")
 @limiter.limit("30 per minute")
 def transaction_status(transaction_id):
     """Check transaction status"""
-    status = mixing_service.get_transaction_status(transaction_id)
+    owner = get_transaction_owner(transaction_id)
     
-    if not status:
+    if not owner:
         abort(404, description="Transaction not found")
     
     # Only show to correct session
-    transaction = MixingTransaction.query.get(transaction_id)
-    if transaction.session_id != session.get('session_id'):
+    if owner != session.get('session_id'):
         abort(403, description="Access denied")
     
+    status = mixing_service.get_transaction_status(transaction_id)
+    if not status:
+        forget_transaction_owner(transaction_id)
+        abort(404, description="Transaction not found")
+    
     return render_template("status.html", status=status)
 
 
@@ -214,25 +309,52 @@ def transaction_status(transaction_id):
 @limiter.limit("60 per minute")
 def check_payment(transaction_id):
     """Check if payment has been received"""
-    transaction = MixingTransaction.query.get(transaction_id)
+    owner = get_transaction_owner(transaction_id)
     
-    if not transaction:
-        return jsonify({"error": "Transaction not found"}), 404
+    if not owner:
+        return json_response({"error": "Transaction not found"}, 404)
     
     # Check session
-    if transaction.session_id != session.get('session_id'):
-        return jsonify({"error": "Access denied"}), 403
+    if owner != session.get('session_id'):
+        return json_response({"error": "Access denied"}, 403)
     
-    # Check payment
-    payment_received = mixing_service.check_incoming_payment(transaction_id)
+    transaction = db.session.get(
+        MixingTransaction,
+        transaction_id,
+        options=[load_only(
+            MixingTransaction.status,
+            MixingTransaction.input_address,
+            MixingTransaction.input_amount
+        )]
+    )
+    if not transaction:
+        forget_transaction_owner(transaction_id)
+        return json_response({"error": "Transaction not found"}, 404)
+    
+    # Check payment, folding concurrent polls into one RPC call per window
+    key = f"pay:{transaction_id}"
+    if transaction.status != TransactionStatus.PENDING:
+        # Already picked up by the beat task; no RPC needed
+        payment_received = True
+    else:
+        cached = redis_client.get(key)
+        if cached is None:
+            payment_received = mixing_service.check_incoming_payment(transaction_id)
+            if payment_received:
+                mixing_service.commit()
+            redis_client.setex(key, PAYMENT_CHECK_TTL, int(payment_received))
+        else:
+            payment_received = cached == b"1"
     
-    return jsonify({
-        "transaction_id": str(transaction.id),
+    response = json_response({
+        "transaction_id": transaction.id,
         "payment_received": payment_received,
         "status": transaction.status.value,
         "input_address": transaction.input_address,
-        "expected_amount": str(transaction.input_amount)
+        "expected_amount": transaction.input_amount
     })
+    response.headers['Cache-Control'] = f"private, max-age={PAYMENT_CHECK_TTL}"
+    return response
 
 
 # Error handlers
@@ -266,6 +388,7 @@ def not_found(e):
 def too_many_requests(e):
     ip = get_client_ip()
     logger.warning(f"Rate limit exceeded for IP: {ip}")
+    record_security_alert(anonymize_ip(ip))
     send_security_alert.delay(
         "RATE_LIMIT_EXCEEDED",
         "medium",
@@ -1,18 +1,128 @@
 """
 Bitcoin Mixing Service - Core mixing logic
 """
-import random
+import itertools
+import json
+import secrets
+import threading
 import time
 from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import List, Dict, Optional, Tuple
+from typing import Any, List, Dict, Optional, Tuple
 import logging
-from bitcoinrpc.authproxy import AuthServiceProxy
+import requests
+from requests.adapters import HTTPAdapter
+from bitcoin_address import validate_address
 from models import db, MixingTransaction, MixingPool, MixingLog, TransactionStatus
 from celery import Celery
 
 logger = logging.getLogger(__name__)
 
+SATS_PER_BTC = 100_000_000
+BASIS_POINTS = 10_000
+HOP_FEE_BPS = 100  # 1% kept back on each simulated mixing hop
+
+
+def btc_to_sats(amount: Decimal) -> int:
+    """Convert a BTC amount to whole satoshis (truncating sub-satoshi dust)"""
+    return int(Decimal(amount) * SATS_PER_BTC)
+
+
+def sats_to_btc(sats: int) -> Decimal:
+    """Convert satoshis to an exact 8-place BTC amount"""
+    return Decimal(sats).scaleb(-8)
+
+
+# Delays and pool choices must not be predictable, so draw them from the OS CSPRNG
+_random = secrets.SystemRandom()
+
+
+class RPCError(Exception):
+    """Error returned by the Bitcoin Core JSON-RPC server"""
+    
+    def __init__(self, error: Dict):
+        super().__init__(error.get('message', error))
+        self.error = error
+        self.code = error.get('code')
+
+
+def _encode_decimal(value):
+    if isinstance(value, Decimal):
+        return float(round(value, 8))
+    raise TypeError(f"{value!r} is not JSON serializable")
+
+
+class BitcoinRPC:
+    """Bitcoin Core JSON-RPC client over a pooled keep-alive HTTP session"""
+    
+    def __init__(self, url: str, user: str, password: str, timeout: int = 30,
+                 pool_connections: int = 10, pool_maxsize: int = 20):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.auth = (user, password)
+        self.session.headers['Content-Type'] = 'application/json'
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._ids = itertools.count(1)
+    
+    def __getattr__(self, method: str):
+        if method.startswith('_'):
+            raise AttributeError(method)
+        return lambda *params: self.call(method, *params)
+    
+    def call(self, method: str, *params) -> Any:
+        """Invoke a single RPC method"""
+        response = self._post(self._request(next(self._ids), method, params))
+        if response.get('error'):
+            raise RPCError(response['error'])
+        return response['result']
+    
+    def batch_(self, calls: List[List]) -> List[Any]:
+        """Invoke several RPC methods in one HTTP round-trip
+        
+        Each call is ``[method, *params]``; results are returned in order. A call
+        that fails yields an ``RPCError`` in its slot instead of raising, so one
+        bad entry doesn't discard the rest of the batch.
+        """
+        if not calls:
+            return []
+        responses = self._post([
+            self._request(i, call[0], call[1:]) for i, call in enumerate(calls)
+        ])
+        # A malformed batch is answered with a single error object, not a list
+        if not isinstance(responses, list):
+            error = responses.get('error') if isinstance(responses, dict) else None
+            raise RPCError(error or {'message': f"Unexpected batch response: {responses!r}"})
+        
+        by_id = {response.get('id'): response for response in responses}
+        results = []
+        for i in range(len(calls)):
+            response = by_id.get(i)
+            if response is None:
+                results.append(RPCError({'message': f"No response for batch call {i}"}))
+            elif response.get('error'):
+                results.append(RPCError(response['error']))
+            else:
+                results.append(response['result'])
+        return results
+    
+    @staticmethod
+    def _request(request_id: int, method: str, params) -> Dict:
+        return {"jsonrpc": "1.0", "id": request_id, "method": method, "params": list(params)}
+    
+    def _post(self, payload):
+        response = self.session.post(
+            self.url,
+            data=json.dumps(payload, default=_encode_decimal),
+            timeout=self.timeout
+        )
+        # bitcoind reports RPC errors as HTTP 500 with a JSON body
+        if not response.content:
+            response.raise_for_status()
+        return json.loads(response.text, parse_float=Decimal)
+
 
 class MixingService:
     """Core mixing service implementation"""
@@ -20,18 +130,27 @@ class MixingService:
     def __init__(self, config):
         self.config = config
         self.rpc = self._init_rpc()
+        # Fee as integer basis points so per-transaction math stays in satoshis
+        self._fee_bps = int(round(config.FEE_PERCENT * BASIS_POINTS))
+        # Log rows are buffered per thread and bulk-inserted on commit
+        self._local = threading.local()
         
-    def _init_rpc(self) -> AuthServiceProxy:
+    def _init_rpc(self) -> BitcoinRPC:
         """Initialize Bitcoin RPC connection"""
         try:
-            rpc_url = f"http://{self.config.RPC_USER}:{self.config.RPC_PASS}@{self.config.RPC_HOST}:{self.config.RPC_PORT}"
-            return AuthServiceProxy(rpc_url)
+            rpc_url = f"http://{self.config.RPC_HOST}:{self.config.RPC_PORT}"
+            return BitcoinRPC(rpc_url, self.config.RPC_USER, self.config.RPC_PASS)
         except Exception as e:
             logger.error(f"Failed to initialize RPC: {e}")
             raise
     
     def validate_bitcoin_address(self, address: str) -> bool:
-        """Validate Bitcoin address using RPC"""
+        """Validate Bitcoin address locally, optionally confirming via RPC"""
+        if not validate_address(address, self.config.BTC_NETWORK):
+            return False
+        if not self.config.STRICT_ADDRESS_VALIDATION:
+            return True
+        
         try:
             result = self.rpc.validateaddress(address)
             return result.get('isvalid', False)
@@ -47,12 +166,17 @@ class MixingService:
             .all()
         
         if len(pools) < count:
-            # Generate new pool addresses if needed
-            for _ in range(count - len(pools)):
-                new_address = self.rpc.getnewaddress("mixing_pool")
-                pool = MixingPool(address=new_address)
-                db.session.add(pool)
-            db.session.commit()
+            # Generate new pool addresses if needed, in one batched RPC call
+            new_addresses = self.rpc.batch_(
+                [["getnewaddress", "mixing_pool"] for _ in range(count - len(pools))]
+            )
+            for new_address in new_addresses:
+                if isinstance(new_address, RPCError):
+                    raise new_address
+            db.session.bulk_save_objects(
+                [MixingPool(address=new_address) for new_address in new_addresses]
+            )
+            self.commit()
             
             # Re-query to get all addresses
             pools = MixingPool.query.filter_by(is_active=True)\
@@ -69,15 +193,19 @@ class MixingService:
                                 ip_hash: str,
                                 user_agent_hash: str) -> MixingTransaction:
         """Create a new mixing transaction"""
-        # Calculate fees
-        fee_amount = input_amount * Decimal(str(self.config.FEE_PERCENT))
-        output_amount = input_amount - fee_amount
+        # Calculate fees in integer satoshis; store the same whole-satoshi
+        # input so fee + output always equals it exactly
+        input_sats = btc_to_sats(input_amount)
+        input_amount = sats_to_btc(input_sats)
+        fee_sats = input_sats * self._fee_bps // BASIS_POINTS
+        fee_amount = sats_to_btc(fee_sats)
+        output_amount = sats_to_btc(input_sats - fee_sats)
         
         # Generate unique input address for this transaction
         input_address = self.rpc.getnewaddress("mixer_input")
         
         # Calculate scheduled output time (random delay)
-        delay_minutes = random.randint(
+        delay_minutes = _random.randint(
             self.config.DELAY_MINUTES_MIN,
             self.config.DELAY_MINUTES_MAX
         )
@@ -97,7 +225,8 @@ class MixingService:
         )
         
         db.session.add(transaction)
-        db.session.commit()
+        # Flush so the generated id is available to the log row
+        db.session.flush()
         
         # Log creation
         self._log_action(transaction.id, "CREATED", {
@@ -105,52 +234,100 @@ class MixingService:
             "output_address": output_address,
             "delay_minutes": delay_minutes
         })
+        self.commit()
         
         return transaction
     
     def check_incoming_payment(self, transaction_id: str) -> bool:
         """Check if payment has been received"""
-        transaction = MixingTransaction.query.get(transaction_id)
-        if not transaction:
+        # Lock and re-read the row so a poll can't race the beat task or
+        # push a transaction that is already mixing back to its start
+        transaction = db.session.get(
+            MixingTransaction,
+            transaction_id,
+            with_for_update=True,
+            populate_existing=True
+        )
+        if not transaction or transaction.status != TransactionStatus.PENDING:
             return False
         
         try:
             # Check for incoming transactions
             received = self.rpc.getreceivedbyaddress(transaction.input_address, 0)
             
-            if received >= float(transaction.input_amount):
+            if received >= transaction.input_amount:
                 # Get transaction ID
                 txlist = self.rpc.listreceivedbyaddress(0, True, True, transaction.input_address)
-                if txlist and txlist[0]['txids']:
-                    transaction.input_txid = txlist[0]['txids'][0]
-                
-                transaction.status = TransactionStatus.MIXING
-                transaction.mixing_started_at = datetime.utcnow()
-                db.session.commit()
-                
-                self._log_action(transaction.id, "PAYMENT_RECEIVED", {
-                    "amount": str(received),
-                    "txid": transaction.input_txid
-                })
-                
+                self._mark_payment_received(transaction, received, txlist)
                 return True
         except Exception as e:
             logger.error(f"Error checking payment: {e}")
             
         return False
     
-    def perform_mixing_round(self, transaction_id: str) -> bool:
-        """Perform one round of mixing"""
-        transaction = MixingTransaction.query.get(transaction_id)
+    def batch_check_incoming_payments(self, rows) -> List[MixingTransaction]:
+        """Check pending transactions with batched RPC calls and return the paid ones
+        
+        ``rows`` only need ``id``, ``input_address`` and ``input_amount``; full
+        ORM objects are loaded, under a row lock, just for paid transactions.
+        """
+        if not rows:
+            return []
+        
+        received_amounts = self.rpc.batch_([
+            ["getreceivedbyaddress", row.input_address, 0] for row in rows
+        ])
+        paid = []
+        for row, received in zip(rows, received_amounts):
+            # A failed lookup only skips its own row, as the per-transaction check did
+            if isinstance(received, RPCError):
+                logger.error(f"Error checking payment for {row.id}: {received}")
+            elif received >= row.input_amount:
+                paid.append((row, received))
+        if not paid:
+            return []
+        
+        txlists = self.rpc.batch_([
+            ["listreceivedbyaddress", 0, True, True, row.input_address] for row, _ in paid
+        ])
+        transactions = []
+        for (row, received), txlist in zip(paid, txlists):
+            if isinstance(txlist, RPCError):
+                logger.error(f"Error listing payment for {row.id}: {txlist}")
+                continue
+            transaction = db.session.get(MixingTransaction, row.id, with_for_update=True)
+            if transaction and transaction.status == TransactionStatus.PENDING:
+                self._mark_payment_received(transaction, received, txlist)
+                transactions.append(transaction)
+        
+        return transactions
+    
+    def _mark_payment_received(self, transaction: MixingTransaction, received: Decimal, txlist: List[Dict]):
+        """Move a transaction into mixing once its payment has arrived"""
+        if txlist and txlist[0]['txids']:
+            transaction.input_txid = txlist[0]['txids'][0]
+        
+        transaction.status = TransactionStatus.MIXING
+        transaction.mixing_started_at = datetime.utcnow()
+        
+        self._log_action(transaction.id, "PAYMENT_RECEIVED", {
+            "amount": str(received),
+            "txid": transaction.input_txid
+        })
+    
+    def perform_mixing_round(self, transaction: MixingTransaction,
+                             pool_addresses: Optional[List[str]] = None) -> bool:
+        """Perform one round of mixing, optionally with pool addresses fetched by the caller"""
         if not transaction or transaction.status != TransactionStatus.MIXING:
             return False
         
         try:
             # Get mixing pool addresses
-            pool_addresses = self.get_mixing_pool_addresses()
+            if not pool_addresses:
+                pool_addresses = self.get_mixing_pool_addresses()
             
             # Select random pool address
-            mixing_address = random.choice(pool_addresses)
+            mixing_address = _random.choice(pool_addresses)
             
             # Move coins to mixing pool
             if transaction.mixing_rounds_completed == 0:
@@ -161,7 +338,8 @@ class MixingService:
                 from_address = transaction.mixing_address
             
             # Create raw transaction (simplified - in production use proper UTXO management)
-            amount_to_send = float(transaction.output_amount) * 0.99  # Small fee for each hop
+            output_sats = btc_to_sats(transaction.output_amount)
+            amount_to_send = sats_to_btc(output_sats - output_sats * HOP_FEE_BPS // BASIS_POINTS)
             
             # In production, implement proper transaction creation
             # For now, we'll simulate the mixing
@@ -182,14 +360,12 @@ class MixingService:
                 # Schedule final output
                 self._schedule_output_transaction(transaction)
             
-            db.session.commit()
             return True
             
         except Exception as e:
             logger.error(f"Mixing round failed: {e}")
             transaction.status = TransactionStatus.FAILED
             transaction.error_message = str(e)
-            db.session.commit()
             return False
     
     def _schedule_output_transaction(self, transaction: MixingTransaction):
@@ -201,27 +377,40 @@ class MixingService:
             "output_address": transaction.output_address
         })
     
-    def send_output_transaction(self, transaction_id: str) -> bool:
+    def send_output_transaction(self, transaction: MixingTransaction) -> bool:
         """Send the final mixed coins to output address"""
-        transaction = MixingTransaction.query.get(transaction_id)
-        if not transaction or transaction.status != TransactionStatus.COMPLETED:
+        if not transaction:
+            return False
+        
+        # Re-read under a row lock right before paying out: an earlier commit
+        # may have released the caller's lock and another worker may have sent it
+        transaction = db.session.get(
+            MixingTransaction,
+            transaction.id,
+            with_for_update=True,
+            populate_existing=True
+        )
+        if (not transaction
+                or transaction.status != TransactionStatus.COMPLETED
+                or transaction.output_txid is not None):
             return False
         
         try:
             # Send transaction
             txid = self.rpc.sendtoaddress(
                 transaction.output_address,
-                float(transaction.output_amount)
+                transaction.output_amount
             )
             
             transaction.output_txid = txid
-            db.session.commit()
-            
             self._log_action(transaction.id, "OUTPUT_SENT", {
                 "txid": txid,
                 "amount": str(transaction.output_amount),
                 "address": transaction.output_address
             })
+            # Coins have left the wallet; persist the txid right away so a
+            # later failure in the same tick can never cause a resend
+            self.commit()
             
             return True
             
@@ -229,19 +418,47 @@ class MixingService:
             logger.error(f"Output transaction failed: {e}")
             transaction.error_message = str(e)
             transaction.retry_count += 1
-            db.session.commit()
             return False
     
     def _log_action(self, transaction_id: str, action: str, details: Dict):
         """Log mixing action"""
-        log = MixingLog(
-            transaction_id=transaction_id,
-            action=action,
-            details=details
-        )
-        db.session.add(log)
+        self._log_buffer.append({
+            'transaction_id': transaction_id,
+            'timestamp': datetime.utcnow(),
+            'action': action,
+            'details': details
+        })
+    
+    @property
+    def _log_buffer(self) -> List[Dict]:
+        buffer = getattr(self._local, 'log_buffer', None)
+        if buffer is None:
+            buffer = self._local.log_buffer = []
+        return buffer
+    
+    def flush_logs(self):
+        """Write buffered log rows with a single bulk INSERT"""
+        buffer = self._log_buffer
+        if buffer:
+            # Transaction rows must exist before the logs referencing them
+            db.session.flush()
+            db.session.bulk_insert_mappings(MixingLog, buffer)
+            buffer.clear()
+    
+    def discard_logs(self):
+        """Drop buffered log rows that will not be committed"""
+        self._log_buffer.clear()
+    
+    def commit(self):
+        """Flush buffered logs and commit the current database transaction"""
+        self.flush_logs()
         db.session.commit()
     
+    def rollback(self):
+        """Discard buffered logs and roll back the current database transaction"""
+        self.discard_logs()
+        db.session.rollback()
+    
     def get_transaction_status(self, transaction_id: str) -> Optional[Dict]:
         """Get transaction status and details"""
         transaction = MixingTransaction.query.get(transaction_id)
@@ -60,9 +60,15 @@ class MixingTransaction(db.Model):
     retry_count = db.Column(db.Integer, default=0)
     
     # Indexes
+    # Partial index predicates compare against enum member names, which is
+    # what db.Enum(TransactionStatus) stores
     __table_args__ = (
         Index('idx_status_created', 'status', 'created_at'),
         Index('idx_session_status', 'session_id', 'status'),
+        Index('idx_ready_outputs', 'scheduled_output_time',
+              postgresql_where=db.text("status = 'COMPLETED' AND output_txid IS NULL")),
+        Index('idx_pending_recent', 'created_at',
+              postgresql_where=db.text("status = 'PENDING'")),
     )
     
     def __repr__(self):
@@ -4,26 +4,41 @@ Enhanced security utilities for Bitcoin Mixer
 import hmac
 import hashlib
 import secrets
-from functools import wraps
+from functools import lru_cache, wraps
 from flask import request, abort, current_app
 from models import SecurityAlert, db
 import re
 
 
+# Basic regex patterns for different address types
+_BTC_ADDRESS_PATTERNS = [
+    re.compile(r'^[13][a-km-zA-HJ-NP-Z1-9]{25,34}$'),  # Legacy
+    re.compile(r'^bc1[a-z0-9]{39,59}$'),  # Bech32
+    re.compile(r'^[2mn][a-km-zA-HJ-NP-Z1-9]{33}$'),  # Testnet
+]
+
+# All SQL injection patterns combined so each value is scanned in one pass
+_SQL_INJECTION_PATTERN = re.compile("|".join([
+    r"(\b(union|select|insert|update|delete|drop|create)\b)",
+    r"(;|--|\*|\/\*|\*\/)",
+    r"(\b(or|and)\b\s*\d+\s*=\s*\d+)",
+    r"('|\"|`)",
+]), re.IGNORECASE)
+
+
+@lru_cache(maxsize=8)
+def _encode_secret(secret: str) -> bytes:
+    """Encode a secret once instead of on every hash/HMAC call"""
+    return secret.encode()
+
+
 class SecurityManager:
     """Security management utilities"""
     
     @staticmethod
     def validate_bitcoin_address(address: str) -> bool:
         """Enhanced Bitcoin address validation"""
-        # Basic regex patterns for different address types
-        patterns = [
-            r'^[13][a-km-zA-HJ-NP-Z1-9]{25,34}$',  # Legacy
-            r'^bc1[a-z0-9]{39,59}$',  # Bech32
-            r'^[2mn][a-km-zA-HJ-NP-Z1-9]{33}$',  # Testnet
-        ]
-        
-        return any(re.match(pattern, address) for pattern in patterns)
+        return any(pattern.match(address) for pattern in _BTC_ADDRESS_PATTERNS)
     
     @staticmethod
     def generate_secure_token(length: int = 32) -> str:
@@ -36,7 +51,10 @@ class SecurityManager:
         if salt is None:
             salt = current_app.config['SECRET_KEY']
         
-        return hashlib.sha256(f"{data}{salt}".encode()).hexdigest()
+        # Equivalent to hashing data + salt, without building the joined string
+        digest = hashlib.sha256(data.encode())
+        digest.update(_encode_secret(salt))
+        return digest.hexdigest()
     
     @staticmethod
     def verify_signature(data: str, signature: str, secret: str = None) -> bool:
@@ -44,29 +62,14 @@ class SecurityManager:
         if secret is None:
             secret = current_app.config['SECRET_KEY']
         
-        expected = hmac.new(
-            secret.encode(),
-            data.encode(),
-            hashlib.sha256
-        ).hexdigest()
+        expected = hmac.digest(_encode_secret(secret), data.encode(), 'sha256').hex()
         
         return hmac.compare_digest(expected, signature)
     
     @staticmethod
     def check_sql_injection(data: str) -> bool:
         """Basic SQL injection detection"""
-        suspicious_patterns = [
-            r"(\b(union|select|insert|update|delete|drop|create)\b)",
-            r"(;|--|\*|\/\*|\*\/)",
-            r"(\b(or|and)\b\s*\d+\s*=\s*\d+)",
-            r"('|\"|`)"
-        ]
-        
-        data_lower = data.lower()
-        for pattern in suspicious_patterns:
-            if re.search(pattern, data_lower, re.IGNORECASE):
-                return False
-        return True
+        return _SQL_INJECTION_PATTERN.search(data) is None
     
     @staticmethod
     def log_security_event(event_type: str, severity: str, details: dict):
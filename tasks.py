@@ -4,13 +4,19 @@ Celery async tasks for Bitcoin Mixer
 from celery import Celery
 from celery.schedules import crontab
 from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional
 import logging
-from models import db, MixingTransaction, TransactionStatus, SecurityAlert
+import secrets
+from models import db, MixingTransaction, MixingLog, TransactionStatus, SecurityAlert
 from mixing_service import MixingService
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Round delays must not be predictable, so draw them from the OS CSPRNG
+_random = secrets.SystemRandom()
+
 # Initialize Celery
 celery = Celery('mixer_tasks')
 celery.config_from_object(Config)
@@ -35,133 +41,198 @@ celery.conf.beat_schedule = {
     },
 }
 
+# Tasks can hold rows locked for a while; don't let a worker hoard messages
+celery.conf.worker_prefetch_multiplier = 1
 
-@celery.task
+
+@lru_cache(maxsize=1)
+def get_mixing_service() -> MixingService:
+    """Mixing service (and its pooled RPC session) shared by all tasks in this worker"""
+    return MixingService(Config)
+
+
+@celery.task(ignore_result=True)
 def check_pending_payments():
     """Check for incoming payments on pending transactions"""
     try:
-        mixing_service = MixingService(Config)
+        mixing_service = get_mixing_service()
+        
+        # Stream only the columns the RPC check needs, as plain rows from a
+        # server-side cursor in fixed-size chunks
+        pending_txs = db.session.execute(
+            db.select(
+                MixingTransaction.id,
+                MixingTransaction.input_address,
+                MixingTransaction.input_amount
+            ).where(
+                MixingTransaction.status == TransactionStatus.PENDING,
+                MixingTransaction.created_at >= datetime.utcnow() - timedelta(hours=24)
+            ).execution_options(yield_per=Config.COMMIT_BATCH_SIZE)
+        )
         
-        # Get all pending transactions
-        pending_txs = MixingTransaction.query.filter_by(
-            status=TransactionStatus.PENDING
-        ).filter(
-            MixingTransaction.created_at >= datetime.utcnow() - timedelta(hours=24)
-        ).all()
+        # One batched RPC round-trip per chunk; commit once the cursor is drained
+        checked = 0
+        paid_txs = []
+        for chunk in pending_txs.partitions():
+            checked += len(chunk)
+            paid_txs.extend(mixing_service.batch_check_incoming_payments(chunk))
+        mixing_service.commit()
         
-        for tx in pending_txs:
-            if mixing_service.check_incoming_payment(str(tx.id)):
-                logger.info(f"Payment received for transaction {tx.id}")
-                # Start mixing process
-                process_mixing.delay(str(tx.id))
+        # Start mixing only once the status change is visible to workers
+        for tx in paid_txs:
+            logger.info(f"Payment received for transaction {tx.id}")
+            process_mixing.delay(str(tx.id), 0)
         
-        return f"Checked {len(pending_txs)} pending transactions"
+        return f"Checked {checked} pending transactions"
         
     except Exception as e:
         logger.error(f"Error checking pending payments: {e}")
+        get_mixing_service().rollback()
         return f"Error: {e}"
 
 
-@celery.task
-def process_mixing(transaction_id: str):
-    """Process mixing rounds for a transaction"""
+@celery.task(acks_late=True)
+def process_mixing(transaction_id: str, expected_round: Optional[int] = None):
+    """Process one mixing round for a transaction and schedule the next
+    
+    ``expected_round`` is the number of rounds completed when the message was
+    queued. With late acks a message can be redelivered after its round was
+    committed; the mismatch then turns it into a no-op instead of running the
+    next round early and forking a second countdown chain.
+    """
     try:
-        mixing_service = MixingService(Config)
-        transaction = MixingTransaction.query.get(transaction_id)
+        mixing_service = get_mixing_service()
+        # Provisioning may commit, so fetch pool addresses before taking the row lock
+        pool_addresses = mixing_service.get_mixing_pool_addresses()
+        
+        # Wait for any beat tick holding this row, then re-read its progress
+        transaction = db.session.get(
+            MixingTransaction,
+            transaction_id,
+            with_for_update=True,
+            populate_existing=True
+        )
         
         if not transaction or transaction.status != TransactionStatus.MIXING:
+            mixing_service.rollback()
             return f"Transaction {transaction_id} not ready for mixing"
         
-        # Perform mixing rounds
-        while transaction.mixing_rounds_completed < Config.MIXING_ROUNDS:
-            if not mixing_service.perform_mixing_round(transaction_id):
+        if expected_round is not None and transaction.mixing_rounds_completed != expected_round:
+            mixing_service.rollback()
+            return f"Round {expected_round} of transaction {transaction_id} already processed"
+        
+        if transaction.mixing_rounds_completed < Config.MIXING_ROUNDS:
+            succeeded = mixing_service.perform_mixing_round(transaction, pool_addresses=pool_addresses)
+            mixing_service.commit()
+            if not succeeded:
                 return f"Mixing failed for transaction {transaction_id}"
-            
-            # Add random delay between rounds (1-5 minutes)
-            import time
-            time.sleep(random.randint(60, 300))
+        
+        if transaction.mixing_rounds_completed < Config.MIXING_ROUNDS:
+            # Random delay between rounds (1-5 minutes) without holding the worker
+            process_mixing.apply_async(
+                args=[transaction_id, transaction.mixing_rounds_completed],
+                countdown=_random.randint(60, 300)
+            )
+            return f"Mixing round {transaction.mixing_rounds_completed} done for transaction {transaction_id}"
         
         return f"Mixing completed for transaction {transaction_id}"
         
     except Exception as e:
         logger.error(f"Error processing mixing: {e}")
+        get_mixing_service().rollback()
         return f"Error: {e}"
 
 
-@celery.task
+@celery.task(ignore_result=True)
 def process_mixing_rounds():
     """Process all active mixing transactions"""
     try:
-        mixing_service = MixingService(Config)
+        mixing_service = get_mixing_service()
+        
+        # Fetch pool addresses once for the whole round, before any rows are locked
+        pool_addresses = mixing_service.get_mixing_pool_addresses()
         
-        # Get transactions in mixing state
+        # Lock a batch of transactions in mixing state; rows held by another
+        # worker are skipped so concurrent ticks process disjoint sets
         mixing_txs = MixingTransaction.query.filter_by(
             status=TransactionStatus.MIXING
-        ).all()
+        ).with_for_update(skip_locked=True).limit(Config.SCHEDULER_PICK_LIMIT).all()
         
-        for tx in mixing_txs:
+        for i, tx in enumerate(mixing_txs, 1):
             if tx.mixing_rounds_completed < Config.MIXING_ROUNDS:
-                mixing_service.perform_mixing_round(str(tx.id))
+                mixing_service.perform_mixing_round(tx, pool_addresses=pool_addresses)
+            if i % Config.COMMIT_BATCH_SIZE == 0:
+                mixing_service.flush_logs()
+        
+        # Single commit for the whole tick
+        mixing_service.commit()
         
         return f"Processed {len(mixing_txs)} mixing transactions"
         
     except Exception as e:
         logger.error(f"Error processing mixing rounds: {e}")
+        get_mixing_service().rollback()
         return f"Error: {e}"
 
 
-@celery.task
+@celery.task(ignore_result=True)
 def send_scheduled_outputs():
     """Send output transactions that are due"""
     try:
-        mixing_service = MixingService(Config)
+        mixing_service = get_mixing_service()
         
         # Get completed transactions ready for output
         ready_txs = MixingTransaction.query.filter(
             MixingTransaction.status == TransactionStatus.COMPLETED,
             MixingTransaction.scheduled_output_time <= datetime.utcnow(),
             MixingTransaction.output_txid.is_(None)
-        ).all()
+        ).with_for_update(skip_locked=True).limit(Config.SCHEDULER_PICK_LIMIT).all()
         
         for tx in ready_txs:
-            if mixing_service.send_output_transaction(str(tx.id)):
+            if mixing_service.send_output_transaction(tx):
                 logger.info(f"Output sent for transaction {tx.id}")
             else:
                 logger.error(f"Failed to send output for transaction {tx.id}")
         
+        # Persist failure bookkeeping (successful sends commit immediately)
+        mixing_service.commit()
+        
         return f"Processed {len(ready_txs)} output transactions"
         
     except Exception as e:
         logger.error(f"Error sending scheduled outputs: {e}")
+        get_mixing_service().rollback()
         return f"Error: {e}"
 
 
-@celery.task
+@celery.task(ignore_result=True)
 def cleanup_old_transactions():
     """Clean up old transaction data for privacy"""
     try:
         # Delete transactions older than 30 days
         cutoff_date = datetime.utcnow() - timedelta(days=30)
         
-        old_txs = MixingTransaction.query.filter(
+        old_tx_ids = db.select(MixingTransaction.id).where(
             MixingTransaction.created_at < cutoff_date
-        ).all()
+        )
         
-        count = len(old_txs)
-        for tx in old_txs:
-            db.session.delete(tx)
+        # Logs reference transactions, so remove them first
+        MixingLog.query.filter(
+            MixingLog.transaction_id.in_(old_tx_ids)
+        ).delete(synchronize_session=False)
+        
+        count = MixingTransaction.query.filter(
+            MixingTransaction.created_at < cutoff_date
+        ).delete(synchronize_session=False)
         
         # Also clean up old security alerts
-        old_alerts = SecurityAlert.query.filter(
+        alert_count = SecurityAlert.query.filter(
             SecurityAlert.created_at < cutoff_date
-        ).all()
-        
-        for alert in old_alerts:
-            db.session.delete(alert)
+        ).delete(synchronize_session=False)
         
         db.session.commit()
         
-        logger.info(f"Cleaned up {count} old transactions and {len(old_alerts)} alerts")
+        logger.info(f"Cleaned up {count} old transactions and {alert_count} alerts")
         return f"Cleaned up {count} transactions"
         
     except Exception as e:
@@ -0,0 +1,92 @@
+"""
+Tests for local Bitcoin address validation
+"""
+import pytest
+
+from bitcoin_address import validate_address
+
+pytestmark = pytest.mark.unit
+
+
+# BIP173 / BIP350 valid segwit addresses
+@pytest.mark.parametrize('address, network', [
+    ('BC1QW508D6QEJXTDG4Y5R3ZARVARY0C5XW7KV8F3T4', 'mainnet'),
+    ('tb1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3q0sl5k7', 'testnet'),
+    ('bc1pw508d6qejxtdg4y5r3zarvary0c5xw7kw508d6qejxtdg4y5r3zarvary0c5xw7kt5nd6y', 'mainnet'),
+    ('BC1SW50QGDZ25J', 'mainnet'),
+    ('bc1zw508d6qejxtdg4y5r3zarvaryvaxxpcs', 'mainnet'),
+    ('tb1qqqqqp399et2xygdj5xreqhjjvcmzhxw4aywxecjdzew6hylgvsesrxh6hy', 'testnet'),
+    ('tb1pqqqqp399et2xygdj5xreqhjjvcmzhxw4aywxecjdzew6hylgvsesf3hn0c', 'testnet'),
+    ('bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqzk5jj0', 'mainnet'),
+])
+def test_valid_segwit(address, network):
+    assert validate_address(address, network)
+
+
+# BIP173 / BIP350 invalid segwit addresses
+@pytest.mark.parametrize('address', [
+    'tc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vq5zuyut',
+    'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqh2y7hd',
+    'tb1z0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqglt7rf',
+    'BC1S0XLXVLHEMJA6C4DQV22UAPCTQUPFHLXM9H8Z3K2E72Q4K9HCZ7VQ54WELL',
+    'bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kemeawh',
+    'tb1q0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vq24jc47',
+    'bc1p38j9r5y49hruaue7wxjce0updqjuyyx0kh56v8s25huc6995vvpql3jow4',
+    'BC130XLXVLHEMJA6C4DQV22UAPCTQUPFHLXM9H8Z3K2E72Q4K9HCZ7VQ7ZWS8R',
+    'bc1pw5dgrnzv',
+    'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7v8n0nx0muaewav253zgeav',
+    'BC1QR508D6QEJXTDG4Y5R3ZARVARYV98GJ9P',
+    'tb1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vq47Zagq',
+    'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7v07qwwzcrf',
+    'tb1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vpggkg4j',
+    'bc1gmk9yu',
+])
+def test_invalid_segwit(address):
+    network = 'testnet' if address.lower().startswith('tb1') else 'mainnet'
+    assert not validate_address(address, network)
+
+
+@pytest.mark.parametrize('address, network', [
+    ('1BvBMSEYstWetqTFn5Au4m4GFg7xJaNVN2', 'mainnet'),
+    ('3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy', 'mainnet'),
+    ('mipcBbFg9gMiCh81Kj8tqqdgoZub1ZJRfn', 'testnet'),
+    ('2MzQwSSnBHWHqSAqtTVQ6v47XtaisrJa1Vc', 'testnet'),
+    ('mipcBbFg9gMiCh81Kj8tqqdgoZub1ZJRfn', 'regtest'),
+])
+def test_valid_base58(address, network):
+    assert validate_address(address, network)
+
+
+@pytest.mark.parametrize('address', [
+    '1BvBMSEYstWetqTFn5Au4m4GFg7xJaNVN3',  # bad checksum
+    '1BvBMSEYstWetqTFn5Au4m4GFg7xJaNVN0',  # '0' is not in the alphabet
+    '1111111111',
+    '',
+])
+def test_invalid_base58(address):
+    assert not validate_address(address, 'mainnet')
+
+
+@pytest.mark.parametrize('address, network', [
+    ('1BvBMSEYstWetqTFn5Au4m4GFg7xJaNVN2', 'testnet'),
+    ('mipcBbFg9gMiCh81Kj8tqqdgoZub1ZJRfn', 'mainnet'),
+    ('BC1QW508D6QEJXTDG4Y5R3ZARVARY0C5XW7KV8F3T4', 'testnet'),
+    ('tb1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3q0sl5k7', 'mainnet'),
+    ('tb1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3q0sl5k7', 'regtest'),
+])
+def test_wrong_network(address, network):
+    assert not validate_address(address, network)
+
+
+@pytest.mark.parametrize('address', [
+    '1' * 100_000,
+    'bc1q' + 'q' * 100_000,
+    '1BvBMSEYstWetqTFn5Au4m4GFg7xJaNVN2' + '1' * 10,
+    '1BvBMSEY',
+])
+def test_rejects_out_of_range_length(address):
+    assert not validate_address(address, 'mainnet')
+
+
+def test_unknown_network():
+    assert not validate_address('1BvBMSEYstWetqTFn5Au4m4GFg7xJaNVN2', 'signet')